@@ -14,6 +14,17 @@ MAX_UPLOAD_SIZE = 5 * 1024  # 5 GB
 
 ALLOWED_ORIGIN = '*'
 
+# Seconds an S3Connection is reused for the same credentials before a new one is built
+CONNECTION_CACHE_TTL = 10 * 60
+
+# Seconds the result of listing a user's buckets is reused when checking their credentials
+BUCKET_LISTING_CACHE_TTL = 60
+
+# Socket timeout in seconds for S3 requests, and how many times boto retries a request that
+# failed with a 5xx or connection error (with randomized exponential backoff between attempts)
+CONNECTION_TIMEOUT = 10
+CONNECTION_RETRIES = 3
+
 BUCKET_LOCATIONS = {}
 ENCRYPT_UPLOADS_DEFAULT = True
 # Load S3 settings used in both front and back end
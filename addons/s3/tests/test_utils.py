@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Tests for addons.s3.utils."""
+import threading
+
+import mock
+from boto.exception import S3ResponseError
+from nose.tools import assert_is, assert_is_not, assert_equal, assert_true, assert_false
+import pytest
+
+from addons.s3 import utils
+
+
+class TestConnectS3:
+
+    @pytest.fixture(autouse=True)
+    def clear_connection_cache(self):
+        utils._connection_cache.clear()
+        utils._bucket_listing_cache.clear()
+        yield
+        utils._connection_cache.clear()
+        utils._bucket_listing_cache.clear()
+
+    @mock.patch('addons.s3.utils.S3Connection')
+    def test_connection_reused_for_same_credentials(self, mock_connection):
+        first = utils.connect_s3('access', 'secret')
+        second = utils.connect_s3('access', 'secret')
+        assert_is(first, second)
+        assert_equal(mock_connection.call_count, 1)
+
+    @mock.patch('addons.s3.utils.S3Connection')
+    def test_connection_not_shared_across_credentials(self, mock_connection):
+        mock_connection.side_effect = lambda *args, **kwargs: mock.Mock()
+        first = utils.connect_s3('access', 'secret')
+        second = utils.connect_s3('access', 'other-secret')
+        assert_is_not(first, second)
+        assert_equal(mock_connection.call_count, 2)
+
+    @mock.patch('addons.s3.utils.time.time')
+    @mock.patch('addons.s3.utils.S3Connection')
+    def test_expired_connection_replaced(self, mock_connection, mock_time):
+        mock_connection.side_effect = lambda *args, **kwargs: mock.Mock()
+        mock_time.return_value = 1000
+        first = utils.connect_s3('access', 'secret')
+        mock_time.return_value = 1000 + utils.CONNECTION_CACHE_TTL
+        second = utils.connect_s3('access', 'secret')
+        assert_is_not(first, second)
+        assert_equal(len(utils._connection_cache), 1)
+
+    @mock.patch('addons.s3.utils.S3Connection')
+    def test_connection_not_shared_across_threads(self, mock_connection):
+        mock_connection.side_effect = lambda *args, **kwargs: mock.Mock()
+        first = utils.connect_s3('access', 'secret')
+        connections = []
+        thread = threading.Thread(target=lambda: connections.append(utils.connect_s3('access', 'secret')))
+        thread.start()
+        thread.join()
+        assert_is_not(first, connections[0])
+        assert_is(first, utils.connect_s3('access', 'secret'))
+
+    @mock.patch('addons.s3.utils.boto3.client')
+    def test_boto3_client_shared_across_threads(self, mock_client):
+        mock_client.side_effect = lambda *args, **kwargs: mock.Mock()
+        first = utils.connect_boto3('access', 'secret')
+        clients = []
+        thread = threading.Thread(target=lambda: clients.append(utils.connect_boto3('access', 'secret')))
+        thread.start()
+        thread.join()
+        assert_is(first, clients[0])
+
+    @mock.patch('addons.s3.utils.boto3.client')
+    @mock.patch('addons.s3.utils.S3Connection')
+    def test_boto3_client_cached_separately(self, mock_connection, mock_client):
+        connection = utils.connect_s3('access', 'secret')
+        client = utils.connect_boto3('access', 'secret')
+        assert_is_not(connection, client)
+        assert_is(client, utils.connect_boto3('access', 'secret'))
+        assert_equal(mock_client.call_count, 1)
+
+    @mock.patch('addons.s3.utils.S3Connection')
+    def test_connection_uses_short_timeout_and_bounded_retries(self, mock_connection):
+        mock_connection.return_value.http_connection_kwargs = {}
+        connection = utils.connect_s3('access', 'secret')
+        assert_equal(connection.http_connection_kwargs['timeout'], utils.CONNECTION_TIMEOUT)
+        assert_equal(connection.num_retries, utils.CONNECTION_RETRIES)
+
+    @mock.patch('addons.s3.utils.S3Connection')
+    def test_bucket_listing_shared_by_credential_checks(self, mock_connection):
+        mock_connection.return_value.get_all_buckets.return_value.owner = mock.sentinel.owner
+        assert_equal(utils.get_user_info('access', 'secret'), mock.sentinel.owner)
+        assert_true(utils.can_list('access', 'secret'))
+        assert_equal(mock_connection.return_value.get_all_buckets.call_count, 1)
+
+    @mock.patch('addons.s3.utils.S3Connection')
+    def test_failed_bucket_listing_not_cached(self, mock_connection):
+        mock_connection.return_value.get_all_buckets.side_effect = [
+            S3ResponseError(403, 'Forbidden'),
+            mock.Mock(),
+        ]
+        assert_false(utils.can_list('access', 'secret'))
+        assert_true(utils.can_list('access', 'secret'))
+
+
+class TestGetBucketPrefixes:
+
+    @mock.patch('addons.s3.utils.connect_boto3')
+    def test_folders_collected_across_pages(self, mock_connect):
+        paginator = mock_connect.return_value.get_paginator.return_value
+        paginator.paginate.return_value = [
+            {'CommonPrefixes': [{'Prefix': 'photos/'}, {'Prefix': 'photos/2019/'}]},
+            {'CommonPrefixes': [{'Prefix': 'photos/2020/'}]},
+            {},
+        ]
+
+        folders = utils.get_bucket_prefixes('access', 'secret', prefix='photos/', bucket_name='bucket')
+
+        mock_connect.return_value.get_paginator.assert_called_once_with('list_objects_v2')
+        assert_equal(paginator.paginate.call_args[1]['Delimiter'], '/')
+        assert_equal([folder['name'] for folder in folders], ['2019', '2020'])
+        assert_equal(folders[0]['id'], 'bucket:/photos/2019/')
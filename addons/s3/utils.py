@@ -1,31 +1,134 @@
 import re
+import time
 import logging
+import threading
 from rest_framework import status as http_status
 
 import boto3
 from boto import exception
+from botocore.config import Config
 from boto.s3.connection import S3Connection
 from boto.s3.connection import OrdinaryCallingFormat
 
 from framework.exceptions import HTTPError
 from addons.base.exceptions import InvalidAuthError, InvalidFolderError
-from addons.s3.settings import BUCKET_LOCATIONS
+from addons.s3.settings import (
+    BUCKET_LISTING_CACHE_TTL,
+    BUCKET_LOCATIONS,
+    CONNECTION_CACHE_TTL,
+    CONNECTION_RETRIES,
+    CONNECTION_TIMEOUT,
+)
 
 logger = logging.getLogger(__name__)
 
+_BUCKET_NAME_LABEL = r'[a-z0-9]+(?:[a-z0-9\-]*[a-z0-9])?'
+BUCKET_NAME_REGEX = re.compile('^' + _BUCKET_NAME_LABEL + '(?:\\.' + _BUCKET_NAME_LABEL + ')*$')
+IP_ADDRESS_REGEX = re.compile(r'^[0-9]+(?:\.[0-9]+){3}$')
+
+# Maps (client type, access_key, secret_key, thread id or None) to a (created, connection) pair
+_connection_cache = {}
+
+# Maps (access_key, secret_key) to a (fetched, buckets) pair
+_bucket_listing_cache = {}
+
+
+def _get_cached_connection(kind, access_key, secret_key, factory, per_thread=False):
+    """Return the connection of type ``kind`` cached for these credentials, building
+    it with ``factory`` if there is none or it is older than ``CONNECTION_CACHE_TTL``.
+    Reusing a connection also reuses the HTTP connections it keeps open to S3.
+
+    Pass ``per_thread`` for connections that are not safe to share between threads; each
+    thread then gets its own. A thread id is only reused once its thread has exited, so a
+    connection is never used by two threads at once.
+    """
+    now = time.time()
+    cache_key = (kind, access_key, secret_key, threading.get_ident() if per_thread else None)
+    cached = _connection_cache.get(cache_key)
+    if cached is not None and now - cached[0] < CONNECTION_CACHE_TTL:
+        return cached[1]
+
+    # Drop expired connections so the cache does not grow without bound
+    for key, (created, _) in list(_connection_cache.items()):
+        if now - created >= CONNECTION_CACHE_TTL:
+            _connection_cache.pop(key, None)
+
+    connection = factory()
+    _connection_cache[cache_key] = (now, connection)
+    return connection
+
 
 def connect_s3(access_key=None, secret_key=None, node_settings=None):
     """Helper to build an S3Connection object
     Can be used to change settings on all S3Connections
     See: CallingFormat
+
+    Connections are cached per set of credentials for ``CONNECTION_CACHE_TTL``
+    seconds so that repeated calls within a request do not each open a new one.
+    boto's S3Connection and its HTTP connection pool are not documented as thread-safe,
+    so the cache is kept per thread; see ``connect_boto3`` for a client that is shared.
     """
     if node_settings is not None:
         if node_settings.external_account is not None:
             access_key, secret_key = node_settings.external_account.oauth_key, node_settings.external_account.oauth_secret
+
+    return _get_cached_connection(
+        'boto', access_key, secret_key,
+        lambda: _build_s3_connection(access_key, secret_key),
+        per_thread=True,
+    )
+
+
+def _build_s3_connection(access_key, secret_key):
     connection = S3Connection(access_key, secret_key, calling_format=OrdinaryCallingFormat())
+    # boto's defaults wait 70 seconds on a socket and retry 6 times; fail faster so one slow
+    # S3 response does not hold up the request thread
+    connection.http_connection_kwargs['timeout'] = CONNECTION_TIMEOUT
+    connection.num_retries = CONNECTION_RETRIES
     return connection
 
 
+def connect_boto3(access_key, secret_key):
+    """Helper to build a boto3 S3 client, cached like ``connect_s3``. boto3 clients
+    are thread-safe and pool their HTTP connections, so one can be shared.
+    """
+    return _get_cached_connection(
+        'boto3', access_key, secret_key,
+        lambda: boto3.client(
+            's3',
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            config=Config(
+                connect_timeout=CONNECTION_TIMEOUT,
+                read_timeout=CONNECTION_TIMEOUT,
+                retries={'max_attempts': CONNECTION_RETRIES},
+            )
+        )
+    )
+
+
+def _get_all_buckets(access_key, secret_key):
+    """Return the result of listing all buckets for these credentials, reusing it for
+    ``BUCKET_LISTING_CACHE_TTL`` seconds. Validating an account asks for both the owner
+    and whether listing is allowed, which would otherwise make two ListAllMyBuckets
+    requests; the response lists every bucket and can be large.
+    """
+    now = time.time()
+    cache_key = (access_key, secret_key)
+    cached = _bucket_listing_cache.get(cache_key)
+    if cached is not None and now - cached[0] < BUCKET_LISTING_CACHE_TTL:
+        return cached[1]
+
+    for key, (fetched, _) in list(_bucket_listing_cache.items()):
+        if now - fetched >= BUCKET_LISTING_CACHE_TTL:
+            _bucket_listing_cache.pop(key, None)
+
+    # Failures raise and are not cached
+    buckets = connect_s3(access_key, secret_key).get_all_buckets()
+    _bucket_listing_cache[cache_key] = (now, buckets)
+    return buckets
+
+
 def get_bucket_names(node_settings):
     try:
         buckets = connect_s3(node_settings=node_settings).get_all_buckets()
@@ -46,11 +149,8 @@ def validate_bucket_name(name):
     http://docs.aws.amazon.com/AmazonS3/latest/dev/BucketRestrictions.html#bucketnamingrules
     The laxer rules for US East (N. Virginia) are not supported.
     """
-    label = r'[a-z0-9]+(?:[a-z0-9\-]*[a-z0-9])?'
-    validate_name = re.compile('^' + label + '(?:\\.' + label + ')*$')
-    is_ip_address = re.compile(r'^[0-9]+(?:\.[0-9]+){3}$')
     return (
-        len(name) >= 3 and len(name) <= 63 and bool(validate_name.match(name)) and not bool(is_ip_address.match(name))
+        len(name) >= 3 and len(name) <= 63 and bool(BUCKET_NAME_REGEX.match(name)) and not bool(IP_ADDRESS_REGEX.match(name))
     )
 
 
@@ -65,13 +165,6 @@ def bucket_exists(access_key, secret_key, bucket_name):
     if not bucket_name:
         return False
 
-    connection = connect_s3(access_key, secret_key)
-
-    if bucket_name != bucket_name.lower():
-        # Must use ordinary calling format for mIxEdCaSe bucket names
-        # otherwise use the default as it handles bucket outside of the US
-        connection.calling_format = OrdinaryCallingFormat()
-
     try:
         # Will raise an exception if bucket_name doesn't exist
         connect_s3(access_key, secret_key).head_bucket(bucket_name)
@@ -91,7 +184,7 @@ def can_list(access_key, secret_key):
         return False
 
     try:
-        connect_s3(access_key, secret_key).get_all_buckets()
+        _get_all_buckets(access_key, secret_key)
     except exception.S3ResponseError:
         return False
     return True
@@ -103,7 +196,7 @@ def get_user_info(access_key, secret_key):
         return None
 
     try:
-        return connect_s3(access_key, secret_key).get_all_buckets().owner
+        return _get_all_buckets(access_key, secret_key).owner
     except exception.S3ResponseError:
         return None
     return None
@@ -116,40 +209,41 @@ def get_bucket_location_or_error(access_key, secret_key, bucket_name):
     except Exception:
         raise InvalidAuthError()
 
-    if bucket_name != bucket_name.lower() or '.' in bucket_name:
-        # Must use ordinary calling format for mIxEdCaSe bucket names
-        # otherwise use the default as it handles bucket outside of the US
-        connection.calling_format = OrdinaryCallingFormat()
-
     try:
         # Will raise an exception if bucket_name doesn't exist
-        return connect_s3(access_key, secret_key).get_bucket(bucket_name, validate=False).get_location()
+        return connection.get_bucket(bucket_name, validate=False).get_location()
     except exception.S3ResponseError:
         raise InvalidFolderError()
 
 
-def get_bucket_prefixes(access_key, secret_key, prefix, bucket_name):
-    s3 = boto3.client(
-        's3',
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key
-    )
+def get_bucket_prefixes(access_key, secret_key, prefix, bucket_name, page_size=1000):
+    """Return the folders directly under ``prefix`` in ``bucket_name``. Listing with a
+    delimiter only returns the current directory level, and paging through the results
+    means directories with more than ``page_size`` subfolders are not truncated.
+    """
+    s3 = connect_boto3(access_key, secret_key)
 
-    result = s3.list_objects(Bucket=bucket_name, Prefix=prefix, Delimiter='/')
+    pages = s3.get_paginator('list_objects_v2').paginate(
+        Bucket=bucket_name,
+        Prefix=prefix,
+        Delimiter='/',
+        PaginationConfig={'PageSize': page_size},
+    )
     folders = []
-    for common_prefixes in result.get('CommonPrefixes', []):
-        key_name = common_prefixes.get('Prefix')
-        if key_name != prefix:
-            folders.append(
-                {
-                    'path': key_name,
-                    'id': f'{bucket_name}:/{key_name}',
-                    'folder_id': key_name,
-                    'kind': 'folder',
-                    'bucket_name': bucket_name,
-                    'name': key_name.split('/')[-2],
-                    'addon': 's3',
-                }
-            )
+    for page in pages:
+        for common_prefixes in page.get('CommonPrefixes', []):
+            key_name = common_prefixes.get('Prefix')
+            if key_name != prefix:
+                folders.append(
+                    {
+                        'path': key_name,
+                        'id': f'{bucket_name}:/{key_name}',
+                        'folder_id': key_name,
+                        'kind': 'folder',
+                        'bucket_name': bucket_name,
+                        'name': key_name.rsplit('/', 2)[-2],
+                        'addon': 's3',
+                    }
+                )
 
     return folders
@@ -23,6 +23,7 @@ from osf.models.base import BaseModel, GuidMixin, ObjectIDMixin
 from osf.utils.fields import NonNaiveDateTimeField
 from osf.utils.requests import get_request_and_user_id, string_type_request_headers
 from osf.exceptions import NodeStateError
+from addons.wiki import settings as wiki_settings
 from addons.wiki import utils as wiki_utils
 from addons.wiki.exceptions import (
     PageCannotRenameError,
@@ -63,13 +64,16 @@ def validate_page_name(value):
     return True
 
 def build_html_output(content, node):
+    return _build_html_output(content, node._id)
+
+def _build_html_output(content, node_id):
     return markdown.markdown(
         content,
         extensions=[
             wikilinks.WikiLinkExtension(
                 base_url='',
                 end_url='',
-                build_url=functools.partial(build_wiki_url, node)
+                build_url=functools.partial(build_wiki_url, node_id)
             ),
             fenced_code.FencedCodeExtension(),
             codehilite.CodeHiliteExtension(css_class='highlight')
@@ -77,16 +81,41 @@ def build_html_output(content, node):
     )
 
 def render_content(content, node):
-    html_output = build_html_output(content, node)
+    return _render_content(content, node._id)
+
+def _render_content(content, node_id):
+    html_output = _build_html_output(content, node_id)
 
     # linkify gets called after santize, because we're adding rel="nofollow"
     #   to <a> elements - but don't want to allow them for other elements.
     sanitized_content = sanitize(html_output, **settings.WIKI_WHITELIST)
     return sanitized_content
 
+def _render_clean_html(content, node_id):
+    """Render and clean wiki markdown. The output depends only on the content and
+    the owning node's guid.
+    """
+    html_output = _build_html_output(content, node_id)
+    try:
+        cleaner = Cleaner(
+            tags=settings.WIKI_WHITELIST['tags'],
+            attributes=settings.WIKI_WHITELIST['attributes'],
+            styles=settings.WIKI_WHITELIST['styles'],
+            filters=[partial(LinkifyFilter, callbacks=[nofollow, ])]
+        )
+        return cleaner.clean(html_output)
+    except TypeError:
+        logger.warning('Returning unlinkified content.')
+        return _render_content(content, node_id)
+
 
-def build_wiki_url(node, label, base, end):
-    return '/{pid}/wiki/{wname}/'.format(pid=node._id, wname=label)
+# Rendered HTML is cached across requests; the key holds the page source, so only
+# pages up to WIKI_HTML_CACHE_MAX_CONTENT_LENGTH are cached to bound its memory
+_clean_html = functools.lru_cache(maxsize=wiki_settings.WIKI_HTML_CACHE_SIZE)(_render_clean_html)
+
+
+def build_wiki_url(node_id, label, base, end):
+    return '/{pid}/wiki/{wname}/'.format(pid=node_id, wname=label)
 
 
 class WikiVersionNodeManager(models.Manager):
@@ -125,18 +154,9 @@ class WikiVersion(ObjectIDMixin, BaseModel):
 
     def html(self, node):
         """The cleaned HTML of the page"""
-        html_output = build_html_output(self.content, node=node)
-        try:
-            cleaner = Cleaner(
-                tags=settings.WIKI_WHITELIST['tags'],
-                attributes=settings.WIKI_WHITELIST['attributes'],
-                styles=settings.WIKI_WHITELIST['styles'],
-                filters=[partial(LinkifyFilter, callbacks=[nofollow, ])]
-            )
-            return cleaner.clean(html_output)
-        except TypeError:
-            logger.warning('Returning unlinkified content.')
-            return render_content(self.content, node=node)
+        if len(self.content) > wiki_settings.WIKI_HTML_CACHE_MAX_CONTENT_LENGTH:
+            return _render_clean_html(self.content, node._id)
+        return _clean_html(self.content, node._id)
 
     def raw_text(self, node):
         """ The raw text of the page, suitable for using in a test search"""
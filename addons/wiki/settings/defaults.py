@@ -13,3 +13,8 @@ SHAREJS_DB_URL = os.environ.get('SHAREJS_DB_URL', 'mongodb://{}:{}/{}'.format(se
 
 # TODO: Change to release date for wiki change
 WIKI_CHANGE_DATE = datetime.datetime.utcfromtimestamp(1423760098).replace(tzinfo=pytz.utc)
+
+# Number of rendered wiki versions to keep in the per-process HTML cache, and the
+# largest page source in characters that is cached
+WIKI_HTML_CACHE_SIZE = 128
+WIKI_HTML_CACHE_MAX_CONTENT_LENGTH = 32 * 1024
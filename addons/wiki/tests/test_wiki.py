@@ -5,6 +5,7 @@
 from copy import deepcopy
 from rest_framework import status as http_status
 import time
+import markdown
 import mock
 import pytest
 import pytz
@@ -24,12 +25,14 @@ from osf.utils.permissions import ADMIN, WRITE, READ
 from addons.wiki import settings
 from addons.wiki import views
 from addons.wiki.exceptions import InvalidVersionError
-from addons.wiki.models import WikiPage, WikiVersion, render_content
+from addons.wiki.models import WikiPage, WikiVersion, _clean_html, render_content
 from addons.wiki.utils import (
     get_sharejs_uuid, generate_private_uuid, share_db, delete_share_doc,
     migrate_uuid, format_wiki_version, serialize_wiki_settings, serialize_wiki_widget
 )
 from framework.auth import Auth
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from addons.wiki.utils import to_mongo_key
 
@@ -61,6 +64,16 @@ class TestWikiViews(OsfTestCase):
         res = self.app.get(url)
         assert_equal(res.status_code, 200)
 
+    def test_get_wiki_versions_queries_do_not_grow_with_versions(self):
+        with CaptureQueriesContext(connection) as two_versions:
+            views._get_wiki_versions(self.project, 'home')
+        for content in ['Version 3', 'Version 4', 'Version 5']:
+            self.home_wiki.update(AuthUserFactory(), content)
+        with CaptureQueriesContext(connection) as five_versions:
+            versions = views._get_wiki_versions(self.project, 'home')
+        assert_equal(len(versions), 5)
+        assert_equal(len(five_versions.captured_queries), len(two_versions.captured_queries))
+
     def test_wiki_url_404_with_no_write_permission(self):  # and not public
         url = self.project.web_url_for('project_wiki_view', wname='somerandomid')
         res = self.app.get(url, auth=self.user.auth)
@@ -708,6 +721,14 @@ class TestWikiRename(OsfTestCase):
 
 class TestWikiLinks(OsfTestCase):
 
+    def setUp(self):
+        super(TestWikiLinks, self).setUp()
+        _clean_html.cache_clear()
+
+    def tearDown(self):
+        _clean_html.cache_clear()
+        super(TestWikiLinks, self).tearDown()
+
     def test_links(self):
         user = AuthUserFactory()
         project = ProjectFactory(creator=user)
@@ -743,6 +764,37 @@ class TestWikiLinks(OsfTestCase):
             wiki.html(node)
         )
 
+    def test_html_rendered_once_per_content_and_node(self):
+        user = AuthUserFactory()
+        project = ProjectFactory(creator=user)
+        wiki_page = WikiFactory(
+            user=user,
+            node=project,
+        )
+        wiki = WikiVersionFactory(
+            content='[[wiki3]] {}'.format(fake.sentence()),
+            wiki_page=wiki_page,
+        )
+        with mock.patch('addons.wiki.models.markdown.markdown', wraps=markdown.markdown) as mock_markdown:
+            first = wiki.html(project)
+            second = WikiVersion.load(wiki._id).html(project)
+        assert_equal(first, second)
+        assert_equal(mock_markdown.call_count, 1)
+
+        other_project = ProjectFactory(creator=user)
+        assert_in('/{}/wiki/wiki3/'.format(other_project._id), wiki.html(other_project))
+
+    @mock.patch('addons.wiki.models.wiki_settings.WIKI_HTML_CACHE_MAX_CONTENT_LENGTH', 10)
+    def test_html_of_large_page_not_cached(self):
+        user = AuthUserFactory()
+        project = ProjectFactory(creator=user)
+        wiki = WikiVersionFactory(
+            content='[[wiki4]] {}'.format(fake.sentence()),
+            wiki_page=WikiFactory(user=user, node=project),
+        )
+        wiki.html(project)
+        assert_equal(_clean_html.cache_info().currsize, 0)
+
 
 @pytest.mark.enable_bookmark_creation
 class TestWikiUuid(OsfTestCase):
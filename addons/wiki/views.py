@@ -75,7 +75,8 @@ def _get_wiki_versions(node, name, anonymous=False):
     # default "home" page is created
     wiki_page = WikiPage.objects.get_for_node(node, name)
     if wiki_page:
-        versions = wiki_page.get_versions()
+        # Only metadata is listed, so skip loading each version's content
+        versions = wiki_page.get_versions().select_related('user').defer('content')
     else:
         return []
 
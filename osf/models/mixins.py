@@ -130,13 +130,10 @@ class Loggable(models.Model):
         return log
 
     def _complete_add_log(self, log, action, user=None, save=True):
-        if self.logs.count() == 1:
-            log_date = log.date if hasattr(log, 'date') else log.created
-            self.last_logged = log_date.replace(tzinfo=pytz.utc)
-        else:
-            recent_log = self.logs.first()
-            log_date = recent_log.date if hasattr(log, 'date') else recent_log.created
-            self.last_logged = log_date
+        # A backdated log may not be the most recent one, so read the newest back
+        recent_log = self.logs.first()
+        log_date = recent_log.date if hasattr(recent_log, 'date') else recent_log.created
+        self.last_logged = log_date.replace(tzinfo=pytz.utc)
 
         if save:
             self.save()
@@ -699,8 +699,9 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         if doi:
             csl['DOI'] = doi
 
-        if self.logs.exists():
-            csl['issued'] = datetime_to_csl(self.logs.latest().date)
+        latest_log_date = self.logs.values_list('date', flat=True).first()
+        if latest_log_date:
+            csl['issued'] = datetime_to_csl(latest_log_date)
 
         return csl
 
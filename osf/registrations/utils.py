@@ -1,15 +1,16 @@
 # -*- coding: utf-8 -*-
 import re
 from abc import ABC, abstractmethod
+import codecs
 import csv
 import io
 import functools
 import string
 
 from django.db.models import Q
+from django.utils.functional import cached_property
 from rest_framework.exceptions import NotFound, ValidationError
 
-from osf.models.licenses import NodeLicense
 from osf.models import AbstractNode, RegistrationProvider, RegistrationSchema, Institution
 from website import settings
 
@@ -37,14 +38,19 @@ CATEGORY_REVERSE_LOOKUP = {display_name: name for name, display_name in settings
 MAX_EXCEL_COLUMN_NUMBER = 16384
 
 FIELD_REGEX = {
-    'license': {
-        'no_required_fields': re.compile(r'(?P<name>[\w\W][^;]+)'),
-        'with_required_fields': re.compile(r'(?P<name>[\w\W]+);\s*?(?P<year>[1-3][0-9]{3})\s*?;(?P<copyright_holders>[\w\W]+)'),
-    },
-    'contributors': re.compile(r'(?P<full_name>[\w\W]+)<(?P<email>.+?)>'),
+    # The year and copyright holders are only matched when present
+    'license': re.compile(r'(?P<name>[^;]+)(?:;\s*(?P<year>[1-3][0-9]{3})\s*;(?P<copyright_holders>[\w\W]+))?'),
+    # The email stops at the first '>' without the lazy quantifier having to backtrack into it
+    'contributors': re.compile(r'(?P<full_name>[\w\W]+)<(?P<email>[^>\n]+)>'),
 }
 
 
+def split_list_value(value):
+    """Split a ";"-separated cell value into its stripped items.
+    """
+    return tuple(val.strip() for val in value.split(';')) if value.strip() else ()
+
+
 @functools.lru_cache(maxsize=MAX_EXCEL_COLUMN_NUMBER)
 def get_excel_column_name(column_index):
     '''Convert a column index to an excel spreadsheet column name by mimicking Base-26 conversion.'''
@@ -95,6 +101,10 @@ def get_schema_questions_validations(registration_schema):
         elif schema_block['block_type'] == 'select-input-option':
             qid = response_key_for_group_key[schema_block['schema_block_group_key']]
             validations[qid]['options'].append(schema_block['display_text'])
+    # Options are only used for membership tests, which are made once per choice in every row
+    for validation in validations.values():
+        if 'options' in validation:
+            validation['options'] = frozenset(validation['options'])
     return validations
 
 class Store():
@@ -102,6 +112,53 @@ class Store():
         self.licenses = registration_provider.licenses_acceptable.all()
         self.subjects = registration_provider.all_subjects.all()
         self.institutions = Institution.objects.get_all_institutions()
+        self.projects = AbstractNode.objects.filter(is_deleted=False, type='osf.node')
+        # Maps each subject text / institution name / project guid already looked up to whether it exists
+        self._known_subjects = {}
+        self._known_institutions = {}
+        self._known_project_ids = {}
+        # Maps each ";"-separated cell value already split to its items
+        self._split_list_values = {}
+
+    @cached_property
+    def licenses_by_name(self):
+        """The provider's acceptable licenses keyed by lowercased name, loaded once per upload.
+        """
+        return {node_license.name.lower(): node_license for node_license in self.licenses}
+
+    def split_list_value(self, value):
+        """Split a ";"-separated cell value. The same values repeat across rows and are split both
+        when prefetching lookups and when validating, so each distinct value is split once per upload.
+        """
+        if value not in self._split_list_values:
+            self._split_list_values[value] = split_list_value(value)
+        return self._split_list_values[value]
+
+    @staticmethod
+    def _filter_existing(values, known, queryset, field_name):
+        """Return the `values` found in `queryset`, querying only those not already in `known`.
+        """
+        unknown = {value for value in values if value not in known}
+        if unknown:
+            existing = set(queryset.filter(**{f'{field_name}__in': unknown}).values_list(field_name, flat=True))
+            known.update({value: value in existing for value in unknown})
+        return [value for value in values if known[value]]
+
+    def get_valid_subjects(self, subjects):
+        """Return the subject texts in `subjects` that belong to the provider. Texts that were
+        already looked up, e.g. by `BulkRegistrationUpload.prefetch`, are not queried again.
+        """
+        return self._filter_existing(subjects, self._known_subjects, self.subjects, 'text')
+
+    def get_valid_institutions(self, institutions):
+        """Return the institution names in `institutions` that exist, as `get_valid_subjects`.
+        """
+        return self._filter_existing(institutions, self._known_institutions, self.institutions, 'name')
+
+    def get_valid_project_ids(self, project_ids):
+        """Return the guids in `project_ids` of projects that exist, as `get_valid_subjects`.
+        """
+        return self._filter_existing(project_ids, self._known_project_ids, self.projects, 'guids___id')
 
 
 class InvalidHeadersError(ValidationError):
@@ -127,14 +184,16 @@ class BulkRegistrationUpload():
 
     def __init__(self, bulk_upload_csv, provider_id):
         if isinstance(bulk_upload_csv, io.StringIO):
-            self.raw_csv = bulk_upload_csv.read()
+            csv_lines = bulk_upload_csv
         else:
-            self.raw_csv = bulk_upload_csv.read().decode('utf-8')
-        csv_io = io.StringIO(self.raw_csv)
-        self.reader = csv.DictReader(csv_io)
-        self.headers = self.reader.fieldnames
-        schema_id_row = next(self.reader)
-        self.schema_id = schema_id_row[self.reader.fieldnames[0]]
+            # Decode the upload as it is read instead of holding a decoded copy of the whole file
+            csv_lines = codecs.iterdecode(bulk_upload_csv, 'utf-8')
+        reader = csv.reader(csv_lines)
+        self.headers = next(reader)
+        # Skip blank lines, as csv.DictReader did
+        rows = (row_values for row_values in reader if row_values)
+        schema_id_row = next(rows)
+        self.schema_id = schema_id_row[0]
         self.provider_id = provider_id
 
         self.registration_provider = RegistrationProvider.load(self.provider_id)
@@ -155,12 +214,9 @@ class BulkRegistrationUpload():
         self.errors = []
         self.validate_csv_header_list()
         self.store = Store(self.registration_provider)
-        self.rows = [Row(row,
-                         self.validations,
-                         self.store,
-                         functools.partial(self.log_error, row_index=index + 3))
-                     for index, row in enumerate(self.reader)]
-        csv_io.close()
+        # Data rows start on the third line of the spreadsheet, after the headers and schema id
+        self.rows = [Row(row_values, index + 3, self.headers, self.validations, self.store, self.log_error)
+                     for index, row_values in enumerate(rows)]
 
     def log_error(self, **kwargs):
         self.errors.append({
@@ -185,20 +241,39 @@ class BulkRegistrationUpload():
         duplicate_headers = self.find_duplicate_headers()
         if duplicate_headers:
             raise DuplicateHeadersError({'duplicate_headers': duplicate_headers})
-        expected_headers = self.validations.keys()
-        actual_headers = self.headers
-        invalid_headers = list(set(actual_headers) - set(expected_headers))
-        missing_headers = list(set(expected_headers) - set(actual_headers))
+        expected_headers = set(self.validations)
+        actual_headers = set(self.headers)
+        invalid_headers = list(actual_headers - expected_headers)
+        missing_headers = list(expected_headers - actual_headers)
         if invalid_headers or missing_headers:
             raise InvalidHeadersError({'invalid_headers': invalid_headers, 'missing_headers': missing_headers})
 
     def get_parsed(self):
-        parsed = []
-        for row in self.rows:
-            parsed.append({'csv_raw': row.get_raw_value(), 'csv_parsed': row.get_parsed_value()})
-        return {'schema_id': self.schema_id, 'registrations': parsed}
+        return {
+            'schema_id': self.schema_id,
+            'registrations': [{'csv_raw': row.get_raw_value(), 'csv_parsed': row.get_parsed_value()} for row in self.rows],
+        }
+
+    def get_column_values(self, header):
+        column_index = self.headers.index(header)
+        return [row.cells[column_index].value for row in self.rows]
+
+    def prefetch(self):
+        """Look up the subjects, institutions and projects of every row with one query each,
+        so that validating each row does not query for its own.
+        """
+        subjects, institutions = set(), set()
+        for value in self.get_column_values('Subjects'):
+            subjects.update(self.store.split_list_value(value))
+        for value in self.get_column_values('Affiliated Institutions'):
+            institutions.update(self.store.split_list_value(value))
+        project_ids = {value.strip() for value in self.get_column_values('Project GUID') if value.strip()}
+        self.store.get_valid_subjects(subjects)
+        self.store.get_valid_institutions(institutions)
+        self.store.get_valid_project_ids(project_ids)
 
     def validate(self):
+        self.prefetch()
         for row in self.rows:
             row.validate()
 
@@ -208,26 +283,26 @@ class Row():
     def is_validated(self):
         return all([cell.is_validated for cell in self.cells])
 
-    def __init__(self, row_dict, validations, store, log_error):
-        self.row_dict = row_dict
-        self.cells = [Cell(header,
-                           value, validations[header], store,
-                           functools.partial(log_error, external_id=row_dict.get('External ID', ''), column_index=column_index))
-                           for column_index, (header, value) in enumerate(row_dict.items())]
+    def __init__(self, row_values, row_index, headers, validations, store, log_error):
+        self.row_index = row_index
+        self._log_error = log_error
+        # Missing trailing cells are treated as empty. Values past the last header have no column
+        # to validate against and are ignored; spreadsheet exports often pad rows with empty cells.
+        if len(row_values) < len(headers):
+            row_values = row_values + [''] * (len(headers) - len(row_values))
+        row_values = row_values[:len(headers)]
+        self.cells = [Cell(header, value, column_index, validations[header], store, self)
+                      for column_index, (header, value) in enumerate(zip(headers, row_values))]
+        self.external_id = next((cell.value for cell in self.cells if cell.header == 'External ID'), '')
+
+    def log_error(self, **kwargs):
+        self._log_error(row_index=self.row_index, external_id=self.external_id, **kwargs)
 
     def get_metadata(self):
-        parsed_metadata = {}
-        for cell in self.cells:
-            if cell.is_metadata:
-                parsed_metadata.update(cell.get_parsed_value())
-        return parsed_metadata
+        return {cell.header: cell.get_parsed_value() for cell in self.cells if cell.is_metadata}
 
     def get_registration_responses(self):
-        parsed_responses = {}
-        for cell in self.cells:
-            if not cell.is_metadata:
-                parsed_responses.update(cell.get_parsed_value())
-        return parsed_responses
+        return {cell.header: cell.get_parsed_value() for cell in self.cells if not cell.is_metadata}
 
     def get_parsed_value(self):
         return {'metadata': self.get_metadata(),
@@ -236,8 +311,7 @@ class Row():
     def get_raw_value(self):
         raw_value_buffer = io.StringIO()
         csv_writer = csv.writer(raw_value_buffer)
-        cell_values = [cell.get_raw_value() for cell in self.cells]
-        csv_writer.writerow(cell_values)
+        csv_writer.writerow(cell.get_raw_value() for cell in self.cells)
         raw_value = raw_value_buffer.getvalue()
         raw_value_buffer.close()
         return raw_value
@@ -248,53 +322,36 @@ class Row():
 
 
 class Cell():
-    @property
-    def is_metadata(self):
-        return self.header in METADATA_FIELDS.keys()
-
     @property
     def is_validated(self):
         return self.field.is_validated
 
-    def __init__(self, header, value, validations, store, log_error):
+    def __init__(self, header, value, column_index, validations, store, row):
         self.header = header
+        self.is_metadata = header in METADATA_FIELDS
         self.value = value
+        self.column_index = column_index
         self.validations = validations
-        self.field = Cell.field_instance_for(self.header,
-                                             self.value,
-                                             self.validations,
-                                             functools.partial(log_error, header=self.header), store)
+        self.row = row
+        self.field = Cell.field_instance_for(self.header, self.value, self.validations, self.log_error, store)
+
+    def log_error(self, **kwargs):
+        self.row.log_error(header=self.header, column_index=self.column_index, **kwargs)
 
     def validate(self):
         self.field.parse()
 
     def get_parsed_value(self):
-        return {self.header: self.field.parse()}
+        return self.field.parse()
 
     def get_raw_value(self):
         return self.value
 
     @classmethod
     def field_instance_for(cls, name, *args):
-        field_instance = None
-        if name in METADATA_FIELDS.keys():
-            if name in CONTRIBUTOR_METADATA_FIELDS:
-                field_instance = ContributorField(*args)
-            elif name == 'License':
-                field_instance = LicenseField(*args)
-            elif name == 'Category':
-                field_instance = CategoryField(*args)
-            elif name == 'Subjects':
-                field_instance = SubjectsField(*args)
-            elif name == 'Affiliated Institutions':
-                field_instance = InstitutionsField(*args)
-            elif name == 'Project GUID':
-                field_instance = ProjectIDField(*args)
-            else:
-                field_instance = MetadataField(*args)
-        else:
-            field_instance = RegistrationResponseField(*args)
-        return field_instance
+        if name in METADATA_FIELDS:
+            return METADATA_FIELD_CLASSES.get(name, MetadataField)(*args)
+        return RegistrationResponseField(*args)
 
 
 class UploadField(ABC):
@@ -330,28 +387,27 @@ class RegistrationResponseField(UploadField):
         self.format = validations.get('format')
         self.options = validations.get('options', [])
         self.value = value.strip()
-        self.log_error = functools.partial(log_error, type='invalidResponse')
+        self.log_error = log_error
 
     def _validate(self):
         parsed_value = None
         if not self.value:
             if self.required:
-                self.log_error()
+                self.log_error(type='invalidResponse')
             return
         if self.type == 'string':
             parsed_value = self.value
         elif self.type == 'choose' and self.format in ['singleselect', 'multiselect']:
             if self.format == 'singleselect':
                 if self.value not in self.options:
-                    self.log_error()
+                    self.log_error(type='invalidResponse')
                 else:
                     parsed_value = self.value
             else:
                 parsed_value = []
-                choices = [val.strip() for val in self.value.split(';')]
-                for choice in choices:
+                for choice in split_list_value(self.value):
                     if choice not in self.options:
-                        self.log_error()
+                        self.log_error(type='invalidResponse')
                     else:
                         parsed_value.append(choice)
         self._parsed_value = parsed_value
@@ -380,7 +436,7 @@ class MetadataField(UploadField):
         if self.format == 'string':
             parsed_value = self.value
         elif self.format == 'list':
-            parsed_value = [val.strip() for val in self.value.split(';')]
+            parsed_value = list(self.store.split_list_value(self.value))
         self._parsed_value = parsed_value
 
 
@@ -392,42 +448,27 @@ class ContributorField(MetadataField):
             if self.required:
                 self.log_error(type=self.error_type['missing'])
             return
-        if not self.value and self.required:
-            self.log_error(type=self.error_type['missing'])
-            return
-        elif not self.value:
-            return
 
         parsed_value = []
-        parsed_contributor_list = [val.strip() for val in self.value.split(';')]
-        for contrib in parsed_contributor_list:
+        for contrib in self.value.split(';'):
             match = self.contributor_regex.match(contrib.strip())
-            if match is not None:
-                try:
-                    full_name = match.group('full_name')
-                    email = match.group('email')
-                except AttributeError:
-                    self.log_error(type=self.error_type['invalid'])
-                else:
-                    parsed_value.append({'full_name': full_name.strip(), 'email': email.strip()})
-            else:
+            if match is None:
                 self.log_error(type=self.error_type['invalid'])
+            else:
+                parsed_value.append({'full_name': match.group('full_name').strip(), 'email': match.group('email').strip()})
         self._parsed_value = parsed_value or None
 
 
 class LicenseField(MetadataField):
-    # format: license_name;year;copyright_holder1,copyright_holder2,...
-    with_required_fields_regex = FIELD_REGEX['license']['with_required_fields']
     # format: license_name;year;copyright_holder1,copyright_holder2,...
     # format: license_name
-    no_required_fields_regex = FIELD_REGEX['license']['no_required_fields']
+    license_regex = FIELD_REGEX['license']
 
     @property
     def default_value(self):
         return {}
 
     def _validate(self):
-        parsed_value = None
         if not self.value:
             if self.required:
                 self.log_error(type=self.error_type['missing'])
@@ -436,29 +477,24 @@ class LicenseField(MetadataField):
         if not hasattr(self.store, 'licenses'):
             raise RuntimeError('store.licenses was not initialized!')
 
-        license_name_match = self.no_required_fields_regex.match(self.value)
-        if license_name_match is not None:
-            node_license_name = license_name_match.group('name').strip()
-            try:
-                node_license = self.store.licenses.get(name__iexact=node_license_name)
-            except NodeLicense.DoesNotExist:
-                self.log_error(type=self.error_type['invalid'])
-            else:
-                has_required_fields = bool(node_license.properties)
-                if has_required_fields:
-                    match = self.with_required_fields_regex.match(self.value)
-                    if match is not None:
-                        year = match.group('year').strip()
-                        copyright_holders = match.group('copyright_holders').strip()
-                        copyright_holders = [val.strip() for val in copyright_holders.split(',')]
-                        parsed_value = {'name': node_license.name,
-                                        'required_fields': {'year': year,
-                                                           'copyright_holders': copyright_holders}}
-                else:
-                    parsed_value = {'name': node_license.name}
-                self._parsed_value = parsed_value
-        else:
+        match = self.license_regex.match(self.value)
+        if match is None:
             self.log_error(type=self.error_type['invalid'])
+            return
+
+        node_license = self.store.licenses_by_name.get(match.group('name').strip().lower())
+        if node_license is None:
+            self.log_error(type=self.error_type['invalid'])
+        elif not node_license.properties:
+            self._parsed_value = {'name': node_license.name}
+        elif match.group('year') is None:
+            # The license requires a year and copyright holders that were not given
+            self.log_error(type=self.error_type['invalid'])
+        else:
+            copyright_holders = [val.strip() for val in match.group('copyright_holders').strip().split(',')]
+            self._parsed_value = {'name': node_license.name,
+                                  'required_fields': {'year': match.group('year'),
+                                                      'copyright_holders': copyright_holders}}
 
 
 class CategoryField(MetadataField):
@@ -478,8 +514,8 @@ class SubjectsField(MetadataField):
         if not hasattr(self.store, 'subjects'):
             raise RuntimeError('store.licenses was not initialized!')
 
-        subjects = [val.strip() for val in self.value.split(';')]
-        valid_subjects = list(self.store.subjects.filter(text__in=subjects).values_list('text', flat=True))
+        subjects = self.store.split_list_value(self.value)
+        valid_subjects = self.store.get_valid_subjects(subjects)
         invalid_subjects = list(set(subjects) - set(valid_subjects))
         if len(invalid_subjects):
             self.log_error(type=self.error_type['invalid'])
@@ -499,8 +535,8 @@ class InstitutionsField(MetadataField):
         if not hasattr(self.store, 'institutions'):
             raise RuntimeError('store.institutions was not initialized!')
 
-        institutions = [val.strip() for val in self.value.split(';')]
-        valid_institutions = list(self.store.institutions.filter(name__in=institutions).values_list('name', flat=True))
+        institutions = self.store.split_list_value(self.value)
+        valid_institutions = self.store.get_valid_institutions(institutions)
         invalid_institutions = list(set(institutions) - set(valid_institutions))
         if len(invalid_institutions):
             self.log_error(type=self.error_type['invalid'])
@@ -512,12 +548,25 @@ class ProjectIDField(MetadataField):
     def _validate(self):
         if not self.value:
             return
-        try:
-            AbstractNode.objects.get(guids___id=self.value, is_deleted=False, type='osf.node')
-        except AbstractNode.DoesNotExist:
-            self.log_error(type=self.error_type['invalid'])
-        else:
+
+        if not hasattr(self.store, 'projects'):
+            raise RuntimeError('store.projects was not initialized!')
+
+        if self.store.get_valid_project_ids([self.value]):
             self._parsed_value = self.value
+        else:
+            self.log_error(type=self.error_type['invalid'])
+
+
+# Metadata fields that need more than MetadataField's parsing, looked up once per cell
+METADATA_FIELD_CLASSES = {
+    **{name: ContributorField for name in CONTRIBUTOR_METADATA_FIELDS},
+    'License': LicenseField,
+    'Category': CategoryField,
+    'Subjects': SubjectsField,
+    'Affiliated Institutions': InstitutionsField,
+    'Project GUID': ProjectIDField,
+}
 
 
 def get_registration_provider_submissions_url(provider):
@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 import csv
 import io
+import mock
 import pytest
 import string
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from nose.tools import assert_equal, assert_true
 from rest_framework.exceptions import NotFound
 
-from osf_tests.factories import SubjectFactory
+from osf_tests.factories import ProjectFactory, SubjectFactory
 from osf.models import RegistrationSchema, RegistrationProvider, NodeLicense
 from osf.registrations.utils import (
     BulkRegistrationUpload,
@@ -19,6 +22,7 @@ from osf.registrations.utils import (
     LicenseField,
     MAX_EXCEL_COLUMN_NUMBER,
     METADATA_FIELDS,
+    RegistrationResponseField,
     Store,
     get_excel_column_name,
 )
@@ -151,6 +155,86 @@ class TestBulkUploadParserValidationErrors:
         })
         test_csv.close()
 
+    def test_subjects_looked_up_once_for_all_rows(self, header_row, open_ended_schema, subjects_list, registration_provider, valid_row):
+        rows = [make_row({'Subjects': subject}) for subject in subjects_list]
+        test_csv = write_csv(header_row, {'Title': open_ended_schema._id}, *rows)
+        upload = BulkRegistrationUpload(test_csv, registration_provider._id)
+        with CaptureQueriesContext(connection) as ctx:
+            upload.validate()
+        subject_queries = [query for query in ctx.captured_queries if '"osf_subject"."text" IN' in query['sql']]
+        assert len(subject_queries) == 1
+        assert upload.errors == []
+        parsed = upload.get_parsed()
+        assert [row['csv_parsed']['metadata']['Subjects'] for row in parsed['registrations']] == [[subject] for subject in subjects_list]
+        test_csv.close()
+
+    def test_licenses_loaded_once_for_all_rows(self, header_row, open_ended_schema, registration_provider, valid_row):
+        test_csv = write_csv(header_row, {'Title': open_ended_schema._id}, valid_row, valid_row, valid_row)
+        upload = BulkRegistrationUpload(test_csv, registration_provider._id)
+        with CaptureQueriesContext(connection) as ctx:
+            upload.validate()
+        license_queries = [query for query in ctx.captured_queries if 'FROM "osf_nodelicense"' in query['sql']]
+        assert len(license_queries) == 1
+        assert upload.errors == []
+        test_csv.close()
+
+    def test_project_guids_looked_up_once_for_all_rows(self, header_row, open_ended_schema, registration_provider, valid_row):
+        project = ProjectFactory()
+        rows = [{**valid_row, 'Project GUID': project._id}, {**valid_row, 'Project GUID': 'abcde'}]
+        test_csv = write_csv(header_row, {'Title': open_ended_schema._id}, *rows)
+        upload = BulkRegistrationUpload(test_csv, registration_provider._id)
+        upload.prefetch()
+        with CaptureQueriesContext(connection) as ctx:
+            upload.validate()
+        # Validating again runs prefetch again, but every guid is already known
+        assert not [query for query in ctx.captured_queries if 'FROM "osf_abstractnode"' in query['sql']]
+        assert_errors(upload.errors, {'Project GUID': METADATA_FIELDS['Project GUID']['error_type']['invalid']})
+        assert len(upload.errors) == 1
+        parsed = upload.get_parsed()
+        assert parsed['registrations'][0]['csv_parsed']['metadata']['Project GUID'] == project._id
+        test_csv.close()
+
+    def test_csv_parsed_from_bytes(self, header_row, open_ended_schema, registration_provider, valid_row):
+        text_csv = write_csv(header_row, {'Title': open_ended_schema._id}, {**valid_row, 'Title': '成龙'})
+        test_csv = io.BytesIO(text_csv.getvalue().encode('utf-8'))
+        upload = BulkRegistrationUpload(test_csv, registration_provider._id)
+        upload.validate()
+        assert upload.errors == []
+        assert upload.get_parsed()['registrations'][0]['csv_parsed']['metadata']['Title'] == '成龙'
+        text_csv.close()
+        test_csv.close()
+
+    def test_fields_validated_once(self, header_row, open_ended_schema, registration_provider, valid_row):
+        test_csv = write_csv(header_row, {'Title': open_ended_schema._id}, valid_row)
+        upload = BulkRegistrationUpload(test_csv, registration_provider._id)
+        with mock.patch.object(LicenseField, '_validate', autospec=True) as mock_validate:
+            upload.validate()
+            upload.get_parsed()
+        assert mock_validate.call_count == 1
+        test_csv.close()
+
+    def test_short_row_treated_as_empty_cells(self, header_row, open_ended_schema, registration_provider):
+        test_csv = io.StringIO(f'{",".join(header_row)}\n{open_ended_schema._id}\nTest title,Test description\n')
+        upload = BulkRegistrationUpload(test_csv, registration_provider._id)
+        upload.validate()
+        assert len(upload.rows[0].cells) == len(header_row)
+        assert {error['header'] for error in upload.errors} == {
+            'Admin Contributors', 'Bibliographic Contributors', 'License', 'Subjects', 'summary'
+        }
+        test_csv.close()
+
+    def test_values_past_last_header_ignored(self, header_row, open_ended_schema, registration_provider):
+        row_values = ['Test title', 'Test description'] + [''] * (len(header_row) - 2) + ['extra', 'values']
+        test_csv = io.StringIO(f'{",".join(header_row)}\n{open_ended_schema._id}\n{",".join(row_values)}\n')
+        upload = BulkRegistrationUpload(test_csv, registration_provider._id)
+        upload.validate()
+        assert len(upload.rows[0].cells) == len(header_row)
+        assert 'extra' not in upload.rows[0].get_raw_value()
+        assert {error['header'] for error in upload.errors} == {
+            'Admin Contributors', 'Bibliographic Contributors', 'License', 'Subjects', 'summary'
+        }
+        test_csv.close()
+
     def test_missing_required_metadata_errors(self, header_row, registration_provider, open_ended_schema):
         missing_required_metadata = {
             'Title': '',
@@ -314,6 +398,37 @@ class TestBulkUploadParserValidationErrors:
             assert errors[-1] == expected_error_type
             assert license._parsed_value is None
 
+    def test_license_missing_required_fields_logs_error(self, registration_provider):
+        store = Store(registration_provider)
+        validations = METADATA_FIELDS['License']
+        for license_value in ['No license', 'No license;;Joan M. Doe', 'No license;2021;']:
+            errors = []
+            license = LicenseField(license_value, validations, lambda **kwargs: errors.append(kwargs['type']), store)
+            license._validate()
+            assert errors == [validations['error_type']['invalid']]
+            assert license._parsed_value is None
+
+    def test_store_splits_each_list_value_once(self, registration_provider):
+        store = Store(registration_provider)
+        subjects = store.split_list_value(' Law ; Medicine ')
+        assert subjects == ('Law', 'Medicine')
+        assert store.split_list_value(' Law ; Medicine ') is subjects
+        assert store.split_list_value('  ') == ()
+        assert Store(registration_provider).split_list_value(' Law ; Medicine ') is not subjects
+
+    def test_multiselect_response_field(self):
+        validations = {'type': 'choose', 'format': 'multiselect', 'options': frozenset(['Yes', 'No', 'Maybe']), 'required': True}
+        errors = []
+        log_error = lambda **kwargs: errors.append(kwargs['type'])
+
+        field = RegistrationResponseField('Yes; Maybe', validations, log_error, None)
+        assert field.parse() == ['Yes', 'Maybe']
+        assert not errors
+
+        field = RegistrationResponseField('Yes;Never;Nope', validations, log_error, None)
+        assert field.parse() == ['Yes']
+        assert errors == ['invalidResponse', 'invalidResponse']
+
     def test_category_field(self):
         valid_categories = [
             ['Analysis', 'analysis'], ['Communication', 'communication'], ['Data', 'data'],
@@ -9,6 +9,8 @@ import pytz
 from django.utils import timezone
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from api.base.settings.defaults import API_BASE
 from api.providers.workflows import Workflows
@@ -21,7 +23,6 @@ from framework.exceptions import HTTPError
 from osf import features
 from osf.migrations import update_provider_auth_groups
 from osf.models import RegistrationSchema, DraftRegistration
-from osf.utils import permissions
 from website.project.metadata.schemas import _name_to_id
 from website.util import api_url_for
 from website.project.views import drafts as draft_views
@@ -31,7 +32,7 @@ from osf_tests.factories import (
     AuthUserFactory,
     DraftRegistrationFactory,
     EmbargoFactory,
-    NodeFactory,
+    ProjectFactory,
     RegistrationFactory,
     RegistrationProviderFactory
 )
@@ -43,6 +44,93 @@ from osf.models import Registration
 
 SCHEMA_VERSION = 2
 
+# The metaschema listing issues one query for its ETag and one for the schemas;
+# the rest is headroom for request setup
+MAX_METASCHEMAS_QUERIES = 5
+
+# Metadata dict is copied from the PUT request to /project/<pid>/drafts/<draft_id>/
+# when adding a file as a supplemental file to a draft registration
+_SPECIAL_FILENAME_METADATA = {
+    'summary': {
+        'value': None,
+        'comments': [],
+        'extra': []
+    },
+    'uploader': {
+        'value': 'Cafe&LunchMenu.pdf',
+        'comments': [],
+        'extra': [{
+            'fileId': 'h8zsj',
+            'data': {
+                'id': 'osfstorage/5ea6ff395288ad0d931c17f5',
+                'type': 'files',
+                'links': {
+                    'move': 'http://localhost:7777/v1/resources/vdbcr/providers/osfstorage/5ea6ff395288ad0d931c17f5',
+                    'upload': 'http://localhost:7777/v1/resources/vdbcr/providers/osfstorage/5ea6ff395288ad0d931c17f5?kind=file',
+                    'delete': 'http://localhost:7777/v1/resources/vdbcr/providers/osfstorage/5ea6ff395288ad0d931c17f5',
+                    'download': 'http://localhost:7777/v1/resources/vdbcr/providers/osfstorage/5ea6ff395288ad0d931c17f5'
+                },
+                'extra': {
+                    'guid': None,
+                    'version': 1,
+                    'downloads': 0,
+                    'checkout': None,
+                    'latestVersionSeen': {
+                        'user': 'bd53u',
+                        'seen': True
+                    },
+                    'hashes': {
+                        'md5': '2919727d545c2a93ea89c3442d2545c5',
+                        'sha256': '2161a32cfe1cbbfbd73aa541fdcb8c407523a8828bfd7a031362e1763a74e8ad'
+                    }
+                },
+                'kind': 'file',
+                'name': 'Cafe&LunchMenu.pdf',
+                'path': '/5ea6ff395288ad0d931c17f5',
+                'provider': 'osfstorage',
+                'materialized': '/Cafe&LunchMenu.pdf',
+                'etag': 'c9248ce917b428c7cae6a7fd45a42b83952db882c4009f0bdf9603a43eab663b',
+                'contentType': None,
+                'modified': '2020-04-27T15:50:18.365664+00:00',
+                'modified_utc': '2020-04-27T15:50:18.365664+00:00',
+                'created_utc': '2020-04-27T15:50:18.365664+00:00',
+                'size': 805847,
+                'sizeInt': 805847,
+                'resource': 'vdbcr',
+                'permissions': {
+                    'view': True,
+                    'edit': True
+                },
+                'nodeId': 'vdbcr',
+                'nodeUrl': '/vdbcr/',
+                'nodeApiUrl': '/api/v1/project/vdbcr/',
+                'accept': {
+                    'maxSize': 5120,
+                    'acceptedFiles': True
+                },
+                'waterbutlerURL': 'http://localhost:7777'
+            },
+            'selectedFileName': 'Cafe&LunchMenu.pdf',
+            'nodeId': 'vdbcr',
+            'viewUrl': '/project/vdbcr/files/osfstorage/5ea6ff395288ad0d931c17f5',
+            'sha256': '2161a32cfe1cbbfbd73aa541fdcb8c407523a8828bfd7a031362e1763a74e8ad',
+            'descriptionValue': ''
+        }]
+    }
+}
+_SPECIAL_FILENAME_PAYLOAD = {
+    'schema_data': _SPECIAL_FILENAME_METADATA,
+    'schema_name': 'Open-Ended Registration',
+    'schema_version': 2
+}
+
+
+@pytest.fixture(autouse=True, scope='module')
+def mock_archive():
+    # Registering drafts kicks off the archiver; patch it once for the whole module
+    with mock.patch('website.archiver.tasks.archive') as mock_archive:
+        yield mock_archive
+
 
 @pytest.mark.django_db
 @pytest.mark.enable_bookmark_creation
@@ -53,8 +141,7 @@ class TestRegistrationViews(RegistrationsTestBase):
         res = self.app.get(url, auth=self.user.auth)
         assert_equal(res.status_code, http_status.HTTP_302_FOUND)
 
-    @mock.patch('website.archiver.tasks.archive')
-    def test_node_register_page_registration(self, mock_archive):
+    def test_node_register_page_registration(self):
         draft_reg = DraftRegistrationFactory(branched_from=self.node, user=self.node.creator)
         reg = self.node.register_node(get_default_metaschema(), self.auth, draft_reg, None)
         url = reg.web_url_for('node_register_page')
@@ -62,16 +149,9 @@ class TestRegistrationViews(RegistrationsTestBase):
         assert_equal(res.status_code, http_status.HTTP_200_OK)
 
     def test_non_admin_can_view_node_register_page(self):
-        non_admin = AuthUserFactory()
-        self.node.add_contributor(
-            non_admin,
-            permissions.DEFAULT_CONTRIBUTOR_PERMISSIONS,
-            auth=self.auth,
-            save=True
-        )
         reg = RegistrationFactory(project=self.node)
         url = reg.web_url_for('node_register_page')
-        res = self.app.get(url, auth=non_admin.auth)
+        res = self.app.get(url, auth=self.non_admin.auth)
         assert_equal(res.status_code, http_status.HTTP_200_OK)
 
     def test_is_public_node_register_page(self):
@@ -123,9 +203,8 @@ class TestDraftRegistrationViews(RegistrationsTestBase):
         assert_equal(res.json['pk'], self.draft._id)
 
     def test_get_draft_registration_deleted(self):
-        self.draft.deleted = timezone.now()
-        self.draft.save()
-        self.draft.reload()
+        DraftRegistration.objects.filter(pk=self.draft.pk).update(deleted=timezone.now())
+        self.draft.refresh_from_db(fields=['deleted'])
 
         url = self.draft_api_url('get_draft_registration')
         res = self.app.get(url, auth=self.user.auth, expect_errors=True)
@@ -142,15 +221,15 @@ class TestDraftRegistrationViews(RegistrationsTestBase):
         assert_equal(res.status_code, http_status.HTTP_403_FORBIDDEN)
 
     def test_get_draft_registrations_only_gets_drafts_for_that_node(self):
-        dummy = NodeFactory()
+        dummy = ProjectFactory(creator=self.user)
 
         # Drafts for dummy node
         for i in range(5):
             d = DraftRegistrationFactory(
                 initiator=self.user,
                 branched_from=dummy,
-                meta_schema=self.meta_schema,
-                schema_data={}
+                registration_schema=self.meta_schema,
+                registration_metadata={}
             )
 
         found = [self.draft]
@@ -159,8 +238,8 @@ class TestDraftRegistrationViews(RegistrationsTestBase):
             d = DraftRegistrationFactory(
                 initiator=self.user,
                 branched_from=self.node,
-                meta_schema=self.meta_schema,
-                schema_data={}
+                registration_schema=self.meta_schema,
+                registration_metadata={}
             )
             found.append(d)
         url = self.node.api_url_for('get_draft_registrations')
@@ -172,8 +251,26 @@ class TestDraftRegistrationViews(RegistrationsTestBase):
         for draft in res.json['drafts']:
             assert_in(draft['pk'], [f._id for f in found])
 
+    def test_get_draft_registrations_queries_do_not_grow_with_drafts(self):
+        url = self.node.api_url_for('get_draft_registrations')
+        # Warm up per-process caches so they do not count against the first request
+        self.app.get(url, auth=self.user.auth)
+        with CaptureQueriesContext(connection) as one_draft:
+            self.app.get(url, auth=self.user.auth)
+        for i in range(3):
+            DraftRegistrationFactory(
+                initiator=self.user,
+                branched_from=self.node,
+                registration_schema=self.meta_schema,
+                registration_metadata={}
+            )
+        with CaptureQueriesContext(connection) as four_drafts:
+            res = self.app.get(url, auth=self.user.auth)
+        assert_equal(len(res.json['drafts']), 4)
+        assert_equal(len(four_drafts.captured_queries), len(one_draft.captured_queries))
+
     def test_new_draft_registration_POST(self):
-        target = NodeFactory(creator=self.user)
+        target = ProjectFactory(creator=self.user)
         payload = {
             'schema_name': self.meta_schema.name,
             'schema_version': self.meta_schema.schema_version
@@ -238,95 +335,21 @@ class TestDraftRegistrationViews(RegistrationsTestBase):
 
         open_ended_schema = RegistrationSchema.objects.get(name='Open-Ended Registration', schema_version=2)
 
-        self.draft.reload()
+        self.draft.refresh_from_db(fields=['registration_schema', 'registration_metadata'])
         assert_equal(open_ended_schema, self.draft.registration_schema)
         assert_equal(metadata, self.draft.registration_metadata)
 
     def test_update_draft_registration_special_filename(self):
-        # Metadata dict is copied from the PUT request to /project/<pid>/drafts/<draft_id>/
-        # when adding a file as a supplemental file to a draft registration
-        metadata = {
-            'summary': {
-                'value': None,
-                'comments': [],
-                'extra': []
-            },
-            'uploader': {
-                'value': 'Cafe&LunchMenu.pdf',
-                'comments': [],
-                'extra': [{
-                    'fileId': 'h8zsj',
-                    'data': {
-                        'id': 'osfstorage/5ea6ff395288ad0d931c17f5',
-                        'type': 'files',
-                        'links': {
-                            'move': 'http://localhost:7777/v1/resources/vdbcr/providers/osfstorage/5ea6ff395288ad0d931c17f5',
-                            'upload': 'http://localhost:7777/v1/resources/vdbcr/providers/osfstorage/5ea6ff395288ad0d931c17f5?kind=file',
-                            'delete': 'http://localhost:7777/v1/resources/vdbcr/providers/osfstorage/5ea6ff395288ad0d931c17f5',
-                            'download': 'http://localhost:7777/v1/resources/vdbcr/providers/osfstorage/5ea6ff395288ad0d931c17f5'
-                        },
-                        'extra': {
-                            'guid': None,
-                            'version': 1,
-                            'downloads': 0,
-                            'checkout': None,
-                            'latestVersionSeen': {
-                                'user': 'bd53u',
-                                'seen': True
-                            },
-                            'hashes': {
-                                'md5': '2919727d545c2a93ea89c3442d2545c5',
-                                'sha256': '2161a32cfe1cbbfbd73aa541fdcb8c407523a8828bfd7a031362e1763a74e8ad'
-                            }
-                        },
-                        'kind': 'file',
-                        'name': 'Cafe&LunchMenu.pdf',
-                        'path': '/5ea6ff395288ad0d931c17f5',
-                        'provider': 'osfstorage',
-                        'materialized': '/Cafe&LunchMenu.pdf',
-                        'etag': 'c9248ce917b428c7cae6a7fd45a42b83952db882c4009f0bdf9603a43eab663b',
-                        'contentType': None,
-                        'modified': '2020-04-27T15:50:18.365664+00:00',
-                        'modified_utc': '2020-04-27T15:50:18.365664+00:00',
-                        'created_utc': '2020-04-27T15:50:18.365664+00:00',
-                        'size': 805847,
-                        'sizeInt': 805847,
-                        'resource': 'vdbcr',
-                        'permissions': {
-                            'view': True,
-                            'edit': True
-                        },
-                        'nodeId': 'vdbcr',
-                        'nodeUrl': '/vdbcr/',
-                        'nodeApiUrl': '/api/v1/project/vdbcr/',
-                        'accept': {
-                            'maxSize': 5120,
-                            'acceptedFiles': True
-                        },
-                        'waterbutlerURL': 'http://localhost:7777'
-                    },
-                    'selectedFileName': 'Cafe&LunchMenu.pdf',
-                    'nodeId': 'vdbcr',
-                    'viewUrl': '/project/vdbcr/files/osfstorage/5ea6ff395288ad0d931c17f5',
-                    'sha256': '2161a32cfe1cbbfbd73aa541fdcb8c407523a8828bfd7a031362e1763a74e8ad',
-                    'descriptionValue': ''
-                }]
-            }
-        }
+        metadata = _SPECIAL_FILENAME_METADATA
         assert_not_equal(metadata, self.draft.registration_metadata)
-        payload = {
-            'schema_data': metadata,
-            'schema_name': 'Open-Ended Registration',
-            'schema_version': 2
-        }
         url = self.node.api_url_for('update_draft_registration', draft_id=self.draft._id)
 
-        res = self.app.put_json(url, payload, auth=self.user.auth)
+        res = self.app.put_json(url, _SPECIAL_FILENAME_PAYLOAD, auth=self.user.auth)
         assert_equal(res.status_code, http_status.HTTP_200_OK)
 
         open_ended_schema = RegistrationSchema.objects.get(name='Open-Ended Registration', schema_version=2)
 
-        self.draft.reload()
+        self.draft.refresh_from_db(fields=['registration_schema', 'registration_metadata'])
         assert_equal(open_ended_schema, self.draft.registration_schema)
         assert_equal(metadata['uploader']['value'], self.draft.registration_metadata['uploader']['value'])
         assert_equal(metadata['uploader']['extra'][0]['selectedFileName'], self.draft.registration_metadata['uploader']['extra'][0]['selectedFileName'])
@@ -355,7 +378,6 @@ class TestDraftRegistrationViews(RegistrationsTestBase):
         assert_equal(res.status_code, http_status.HTTP_403_FORBIDDEN)
 
     def test_delete_draft_registration(self):
-        assert_equal(1, DraftRegistration.objects.filter(deleted__isnull=True).count())
         url = self.node.api_url_for('delete_draft_registration', draft_id=self.draft._id)
 
         res = self.app.delete(url, auth=self.user.auth)
@@ -363,7 +385,6 @@ class TestDraftRegistrationViews(RegistrationsTestBase):
         assert_equal(0, DraftRegistration.objects.filter(deleted__isnull=True).count())
 
     def test_delete_draft_registration_non_admin(self):
-        assert_equal(1, DraftRegistration.objects.filter(deleted__isnull=True).count())
         url = self.node.api_url_for('delete_draft_registration', draft_id=self.draft._id)
 
         res = self.app.delete(url, auth=self.non_admin.auth, expect_errors=True)
@@ -374,20 +395,19 @@ class TestDraftRegistrationViews(RegistrationsTestBase):
         res = self.app.delete(url, auth=self.group_mem.auth, expect_errors=True)
         assert_equal(res.status_code, http_status.HTTP_403_FORBIDDEN)
 
-    @mock.patch('website.archiver.tasks.archive')
-    def test_delete_draft_registration_registered(self, mock_register_draft):
+    def test_delete_draft_registration_registered(self):
         self.draft.register(auth=self.auth, save=True)
         url = self.node.api_url_for('delete_draft_registration', draft_id=self.draft._id)
 
         res = self.app.delete(url, auth=self.user.auth, expect_errors=True)
         assert_equal(res.status_code, http_status.HTTP_403_FORBIDDEN)
 
-    @mock.patch('website.archiver.tasks.archive')
-    def test_delete_draft_registration_approved_and_registration_deleted(self, mock_register_draft):
+    def test_delete_draft_registration_approved_and_registration_deleted(self):
         self.draft.register(auth=self.auth, save=True)
         self.draft.registered_node.is_deleted = True
         self.draft.registered_node.save()
 
+        # Registering must not have deleted the draft, or the final count proves nothing
         assert_equal(1, DraftRegistration.objects.filter(deleted__isnull=True).count())
         url = self.node.api_url_for('delete_draft_registration', draft_id=self.draft._id)
 
@@ -396,17 +416,17 @@ class TestDraftRegistrationViews(RegistrationsTestBase):
         assert_equal(0, DraftRegistration.objects.filter(deleted__isnull=True).count())
 
     def test_only_admin_can_delete_registration(self):
-        non_admin = AuthUserFactory()
-        assert_equal(1, DraftRegistration.objects.filter(deleted__isnull=True).count())
         url = self.node.api_url_for('delete_draft_registration', draft_id=self.draft._id)
 
-        res = self.app.delete(url, auth=non_admin.auth, expect_errors=True)
+        res = self.app.delete(url, auth=self.non_contrib.auth, expect_errors=True)
         assert_equal(res.status_code, http_status.HTTP_403_FORBIDDEN)
         assert_equal(1, DraftRegistration.objects.filter(deleted__isnull=True).count())
 
     def test_get_metaschemas(self):
         url = api_url_for('get_metaschemas')
-        res = self.app.get(url).json
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.app.get(url).json
+        assert_less_equal(len(ctx.captured_queries), MAX_METASCHEMAS_QUERIES)
         assert_equal(
             len(res['meta_schemas']),
             RegistrationSchema.objects.get_latest_versions().count()
@@ -414,13 +434,54 @@ class TestDraftRegistrationViews(RegistrationsTestBase):
 
     def test_get_metaschemas_all(self):
         url = api_url_for('get_metaschemas', include='all')
-        res = self.app.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.app.get(url)
+        assert_less_equal(len(ctx.captured_queries), MAX_METASCHEMAS_QUERIES)
         assert_equal(res.status_code, http_status.HTTP_200_OK)
         assert_equal(
             len(res.json['meta_schemas']),
             RegistrationSchema.objects.filter(active=True).count()
         )
 
+    def test_get_metaschemas_not_modified(self):
+        url = api_url_for('get_metaschemas')
+        res = self.app.get(url)
+        etag = res.headers['ETag']
+
+        res = self.app.get(url, headers={'If-None-Match': etag})
+        assert_equal(res.status_code, http_status.HTTP_304_NOT_MODIFIED)
+
+    def test_get_metaschemas_not_modified_weak_etag(self):
+        # Proxies and CDNs may weaken the tag; If-None-Match uses weak comparison
+        url = api_url_for('get_metaschemas')
+        res = self.app.get(url)
+        etag = res.headers['ETag']
+
+        res = self.app.get(url, headers={'If-None-Match': 'W/' + etag})
+        assert_equal(res.status_code, http_status.HTTP_304_NOT_MODIFIED)
+
+    def test_get_metaschemas_deactivated_schema_changes_etag(self):
+        url = api_url_for('get_metaschemas', include='all')
+        res = self.app.get(url)
+        etag = res.headers['ETag']
+
+        # Queryset updates bypass save() and do not bump `modified`
+        RegistrationSchema.objects.filter(id=self.meta_schema.id).update(active=False)
+
+        res = self.app.get(url, headers={'If-None-Match': etag})
+        assert_equal(res.status_code, http_status.HTTP_200_OK)
+        assert_not_equal(res.headers['ETag'], etag)
+        assert_not_in(self.meta_schema._id, [schema['id'] for schema in res.json['meta_schemas']])
+
+    def test_get_metaschemas_modified(self):
+        url = api_url_for('get_metaschemas')
+        res = self.app.get(url, headers={'If-None-Match': '"stale"'})
+        assert_equal(res.status_code, http_status.HTTP_200_OK)
+        assert_equal(
+            len(res.json['meta_schemas']),
+            RegistrationSchema.objects.get_latest_versions().count()
+        )
+
     def test_validate_embargo_end_date_too_soon(self):
         registration = RegistrationFactory(project=self.node)
         today = dt.datetime.today().replace(tzinfo=pytz.utc)
@@ -574,3 +635,19 @@ class TestModeratorRegistrationViews:
 
         resp = app.get(registration_subpath, auth=moderator.auth)
         assert resp.status_code == 200
+
+    def test_moderator_subpath_queries_do_not_grow_with_drafts(
+        self, app, embargoed_registration, moderator, registration_subpath):
+        embargoed_registration.embargo.accept()
+        embargoed_registration.refresh_from_db()
+        # Warm up per-process caches so they do not count against the first request
+        app.get(registration_subpath, auth=moderator.auth)
+
+        with CaptureQueriesContext(connection) as one_draft:
+            app.get(registration_subpath, auth=moderator.auth)
+        for i in range(3):
+            DraftRegistrationFactory(branched_from=embargoed_registration.registered_from)
+        with CaptureQueriesContext(connection) as four_drafts:
+            resp = app.get(registration_subpath, auth=moderator.auth)
+        assert resp.status_code == 200
+        assert len(four_drafts.captured_queries) == len(one_draft.captured_queries)
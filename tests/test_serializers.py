@@ -13,7 +13,7 @@ from osf_tests.factories import (
     OSFGroupFactory,
     CollectionFactory,
 )
-from osf.models import NodeRelation
+from osf.models import AbstractNode, Node, NodeRelation
 from osf.utils import permissions
 from tests.base import OsfTestCase, get_default_metaschema
 
@@ -268,6 +268,13 @@ class TestViewProjectEmbeds(OsfTestCase):
         self.user = UserFactory()
         self.project = ProjectFactory(creator=self.user)
 
+    def test_serialize_node_summary_uses_prefetched_contributors(self):
+        node = Node.objects.filter(pk=self.project.pk).prefetch_related('contributor_set__user__guids').get()
+        with mock.patch.object(AbstractNode.objects, 'filter', wraps=AbstractNode.objects.filter) as mock_filter:
+            res = serialize_node_summary(node, auth=Auth(self.user))
+        assert_not_in(mock.call(pk=node.pk), mock_filter.call_args_list)
+        assert_equal(res['contributors'][0]['user_id'], self.user._id)
+
     def test_view_project_embed_forks_excludes_registrations(self):
         project = ProjectFactory()
         fork = project.fork_node(Auth(project.creator))
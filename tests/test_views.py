@@ -69,6 +69,7 @@ from osf.utils import permissions
 from osf.models import (
     Comment,
     AbstractNode,
+    Guid,
     NodeLog,
     OSFUser,
     Tag,
@@ -4475,6 +4476,30 @@ class TestReorderComponents(OsfTestCase):
         res = self.app.post_json(url, payload, auth=self.contrib.auth)
         assert_equal(res.status_code, 200)
 
+    def test_reorder_components_with_unknown_component(self):
+        payload = {
+            'new_list': [
+                '{0}'.format(self.private_component._id),
+                'abcde',
+            ]
+        }
+        url = self.project.api_url_for('project_reorder_components')
+        res = self.app.post_json(url, payload, auth=self.contrib.auth, expect_errors=True)
+        assert_equal(res.status_code, 400)
+
+    def test_reorder_components_with_multiple_guids_uses_current_guid(self):
+        new_guid = Guid.objects.create(referent=self.public_component)
+        assert_equal(AbstractNode.objects.get(id=self.public_component.id)._id, new_guid._id)
+        payload = {
+            'new_list': [
+                '{0}'.format(new_guid._id),
+                '{0}'.format(self.private_component._id),
+            ]
+        }
+        url = self.project.api_url_for('project_reorder_components')
+        res = self.app.post_json(url, payload, auth=self.contrib.auth)
+        assert_equal(res.status_code, 200)
+
 
 class TestWikiWidgetViews(OsfTestCase):
 
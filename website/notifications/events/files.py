@@ -125,12 +125,14 @@ class ComplexFileEvent(FileEvent):
 
     def _build_message(self, html=False):
         addon, f_type, action = tuple(self.action.split('_'))
+        source = self.payload['source']
+        destination = self.payload['destination']
         # f_type is always file for the action
-        if self.payload['destination']['kind'] == u'folder':
+        if destination['kind'] == u'folder':
             f_type = 'folder'
 
-        destination_name = self.payload['destination']['materialized'].lstrip('/')
-        source_name = self.payload['source']['materialized'].lstrip('/')
+        destination_name = destination['materialized'].lstrip('/')
+        source_name = source['materialized'].lstrip('/')
 
         if html:
             return (
@@ -141,11 +143,11 @@ class ComplexFileEvent(FileEvent):
                 action=markupsafe.escape(action),
                 f_type=markupsafe.escape(f_type),
                 source_name=markupsafe.escape(source_name),
-                source_addon=markupsafe.escape(self.payload['source']['addon']),
-                source_node_title=markupsafe.escape(self.payload['source']['node']['title']),
+                source_addon=markupsafe.escape(source['addon']),
+                source_node_title=markupsafe.escape(source['node']['title']),
                 dest_name=markupsafe.escape(destination_name),
-                dest_addon=markupsafe.escape(self.payload['destination']['addon']),
-                dest_node_title=markupsafe.escape(self.payload['destination']['node']['title']),
+                dest_addon=markupsafe.escape(destination['addon']),
+                dest_node_title=markupsafe.escape(destination['node']['title']),
             )
         return (
             u'{action} {f_type} "{source_name}" '
@@ -155,11 +157,11 @@ class ComplexFileEvent(FileEvent):
             action=action,
             f_type=f_type,
             source_name=source_name,
-            source_addon=self.payload['source']['addon'],
-            source_node_title=self.payload['source']['node']['title'],
+            source_addon=source['addon'],
+            source_node_title=source['node']['title'],
             dest_name=destination_name,
-            dest_addon=self.payload['destination']['addon'],
-            dest_node_title=self.payload['destination']['node']['title'],
+            dest_addon=destination['addon'],
+            dest_node_title=destination['node']['title'],
         )
 
     @property
@@ -23,7 +23,10 @@ def serialize_meta_schema(meta_schema):
 def serialize_meta_schemas(meta_schemas):
     return [serialize_meta_schema(schema) for schema in (meta_schemas or [])]
 
-def serialize_draft_registration(draft, auth=None):
+def serialize_draft_registration(draft, auth=None, serialized_node=None):
+    """Serialize a draft registration. Pass `serialized_node` when listing several drafts of
+    the same node so the node is only serialized once.
+    """
     from website.project.utils import serialize_node  # noqa
     from api.base.utils import absolute_reverse
 
@@ -31,7 +34,7 @@ def serialize_draft_registration(draft, auth=None):
 
     return {
         'pk': draft._id,
-        'branched_from': serialize_node(node, auth),
+        'branched_from': serialized_node or serialize_node(node, auth),
         'initiator': serialize_initiator(draft.initiator),
         'registration_metadata': draft.registration_metadata,
         'registration_schema': serialize_meta_schema(draft.registration_schema),
@@ -1,4 +1,5 @@
 import functools
+import hashlib
 from rest_framework import status as http_status
 import itertools
 import html
@@ -9,6 +10,7 @@ from dateutil.parser import parse as parse_date
 from django.utils import timezone
 from flask import request, redirect
 import pytz
+from werkzeug.http import quote_etag
 
 from framework.database import autoload
 from framework.exceptions import HTTPError
@@ -143,8 +145,15 @@ def get_draft_registrations(auth, node, *args, **kwargs):
     """
     #'updated': '2016-08-03T14:24:12Z'
     count = request.args.get('count', 100)
-    drafts = itertools.islice(node.draft_registrations_active, 0, count)
-    serialized_drafts = [serialize_draft_registration(d, auth) for d in drafts]
+    drafts = itertools.islice(
+        node.draft_registrations_active.select_related(
+            'branched_from', 'initiator', 'registration_schema'
+        ).prefetch_related('branched_from__guids', 'initiator__guids'),
+        0, count
+    )
+    # Every draft here is branched from `node`, so serialize it once
+    serialized_node = serialize_node(node, auth)
+    serialized_drafts = [serialize_draft_registration(d, auth, serialized_node=serialized_node) for d in drafts]
     sorted_serialized_drafts = sorted(serialized_drafts, key=itemgetter('updated'), reverse=True)
     return {
         'drafts': sorted_serialized_drafts
@@ -270,6 +279,16 @@ def order_schemas(schema):
         return len(METASCHEMA_ORDERING)
 
 
+def get_metaschemas_etag(meta_schemas, include, count):
+    """Build an entity tag for the metaschema listing from the schemas being served, so
+    unchanged listings can be answered with a 304. `active` and `visible` are part of the tag
+    because bulk updates to them (e.g. in migrations) do not bump `modified`.
+    """
+    state = list(meta_schemas.order_by('id').values_list('id', 'modified', 'active', 'visible'))
+    key = '{}:{}:{}'.format(include, count, state)
+    return hashlib.md5(key.encode()).hexdigest()
+
+
 def get_metaschemas(*args, **kwargs):
     """
     List metaschemas with which a draft registration may be created. Only fetch the newest version for each schema.
@@ -284,10 +303,15 @@ def get_metaschemas(*args, **kwargs):
     if include == 'latest':
         meta_schemas = RegistrationSchema.objects.get_latest_versions()
 
+    etag = get_metaschemas_etag(meta_schemas, include, count)
+    headers = {'ETag': quote_etag(etag)}
+    if request.if_none_match.contains_weak(etag):
+        return None, http_status.HTTP_304_NOT_MODIFIED, headers
+
     meta_schemas = sorted(meta_schemas, key=order_schemas)
 
     return {
         'meta_schemas': [
             serialize_meta_schema(ms) for ms in meta_schemas[:count]
         ]
-    }, http_status.HTTP_200_OK
+    }, http_status.HTTP_200_OK, headers
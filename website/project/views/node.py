@@ -3,7 +3,7 @@ import os
 import logging
 from rest_framework import status as http_status
 import math
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 from flask import request
 from django.apps import apps
@@ -511,10 +511,14 @@ def project_reorder_components(node, **kwargs):
     :param-json list new_list: List of strings that include node GUIDs.
     """
     ordered_guids = request.get_json().get('new_list', [])
-    node_relations = (
+    # NodeRelation pk -> child guid, fetched in one query instead of loading each child's guid.
+    # A child may have several guids; rows come oldest first so its current (newest) guid,
+    # the one `child._id` returns, wins.
+    child_guids = dict(
         node.node_relations
-            .select_related('child')
             .filter(child__is_deleted=False)
+            .order_by('child__guids__created')
+            .values_list('pk', 'child__guids___id')
     )
     deleted_node_relation_ids = list(
         node.node_relations.select_related('child')
@@ -522,16 +526,13 @@ def project_reorder_components(node, **kwargs):
         .values_list('pk', flat=True)
     )
 
-    if len(ordered_guids) > len(node_relations):
+    if len(ordered_guids) > len(child_guids):
         raise HTTPError(http_status.HTTP_400_BAD_REQUEST, data=dict(message_long='Too many node IDs'))
 
-    # Ordered NodeRelation pks, sorted according the order of guids passed in the request payload
-    new_node_relation_ids = [
-        each.id for each in sorted(node_relations,
-                                   key=lambda nr: ordered_guids.index(nr.child._id))
-    ]
-
-    if len(node_relations) == len(ordered_guids):
+    if Counter(ordered_guids) == Counter(child_guids.values()):
+        # Ordered NodeRelation pks, sorted according the order of guids passed in the request payload
+        positions = {guid: index for index, guid in enumerate(ordered_guids)}
+        new_node_relation_ids = sorted(child_guids, key=lambda pk: positions[child_guids[pk]])
         node.set_noderelation_order(new_node_relation_ids + deleted_node_relation_ids)
         node.save()
         return {'nodes': ordered_guids}
@@ -677,11 +678,13 @@ def _render_addons(addons):
     return widgets, configs, js, css
 
 
-def _should_show_wiki_widget(node, user):
+def _should_show_wiki_widget(node, user, can_edit=None):
     has_wiki = bool(node.get_addon('wiki'))
     wiki_page = WikiVersion.objects.get_for_node(node, 'home')
 
-    if node.has_permission(user, WRITE) and not node.is_registration:
+    if can_edit is None:
+        can_edit = node.has_permission(user, WRITE)
+    if can_edit and not node.is_registration:
         return has_wiki
     else:
         return has_wiki and wiki_page and wiki_page.html(node)
@@ -711,11 +714,16 @@ def _view_project(node, auth, primary=False,
     widgets, configs, js, css = _render_addons(addons)
     redirect_url = node.url + '?view_only=None'
 
+    # Permission checks each cost a query; compute them once for the whole page
+    is_admin = node.has_permission(user, ADMIN)
+    can_edit = node.has_permission(user, WRITE)
+    storage_region = node.osfstorage_region
+
     disapproval_link = ''
-    if (node.is_pending_registration and node.has_permission(user, ADMIN)):
+    if (node.is_pending_registration and is_admin):
         disapproval_link = node.root.registration_approval.stashed_urls.get(user._id, {}).get('reject', '')
 
-    if (node.is_pending_embargo and node.has_permission(user, ADMIN)):
+    if (node.is_pending_embargo and is_admin):
         disapproval_link = node.root.embargo.stashed_urls.get(user._id, {}).get('reject', '')
 
     # Before page load callback; skip if not primary call
@@ -727,6 +735,7 @@ def _view_project(node, auth, primary=False,
     NodeRelation = apps.get_model('osf.NodeRelation')
 
     is_registration = node.is_registration
+    retraction = node.root.retraction if is_registration else None
 
     data = {
         'node': {
@@ -748,7 +757,7 @@ def _view_project(node, auth, primary=False,
             'is_public': node.is_public,
             'is_archiving': node.archiving,
             'date_created': iso8601format(node.created),
-            'date_modified': iso8601format(node.last_logged) if node.last_logged else '',
+            'date_modified': iso8601format(node.last_logged),
             'tags': list(node.tags.filter(system=False).values_list('name', flat=True)),
             'children': node.nodes_active.exists(),
             'child_exists': Node.objects.get_children(node, active=True).exists(),
@@ -757,8 +766,8 @@ def _view_project(node, auth, primary=False,
             'is_pending_registration': node.is_pending_registration if is_registration else False,
             'is_retracted': node.is_retracted if is_registration else False,
             'is_pending_retraction': node.is_pending_retraction if is_registration else False,
-            'retracted_justification': getattr(node.root.retraction, 'justification', None) if is_registration else None,
-            'date_retracted': iso8601format(getattr(node.root.retraction, 'date_retracted', None)) if is_registration else '',
+            'retracted_justification': getattr(retraction, 'justification', None) if is_registration else None,
+            'date_retracted': iso8601format(getattr(retraction, 'date_retracted', None)) if is_registration else '',
             'embargo_end_date': node.embargo_end_date.strftime('%A, %b %d, %Y') if is_registration and node.embargo_end_date else '',
             'is_pending_embargo': node.is_pending_embargo if is_registration else False,
             'is_embargoed': node.is_embargoed if is_registration else False,
@@ -793,9 +802,9 @@ def _view_project(node, auth, primary=False,
             'institutions': get_affiliated_institutions(node) if node else [],
             'has_draft_registrations': node.has_active_draft_registrations,
             'access_requests_enabled': node.access_requests_enabled,
-            'storage_location': node.osfstorage_region.name,
-            'waterbutler_url': node.osfstorage_region.waterbutler_url,
-            'mfr_url': node.osfstorage_region.mfr_url,
+            'storage_location': storage_region.name,
+            'waterbutler_url': storage_region.waterbutler_url,
+            'mfr_url': storage_region.mfr_url,
             'groups': list(node.osf_groups.values_list('name', flat=True)),
             'storage_limit_status': get_storage_limits_css(node),
         },
@@ -816,18 +825,18 @@ def _view_project(node, auth, primary=False,
         'user': {
             'is_contributor_or_group_member': node.is_contributor_or_group_member(user),
             'is_contributor': node.is_contributor(user),
-            'is_admin': node.has_permission(user, ADMIN),
+            'is_admin': is_admin,
             'is_admin_parent_contributor': parent.is_admin_parent(user, include_group_admin=False) if parent else False,
             'is_admin_parent_contributor_or_group_member': parent.is_admin_parent(user) if parent else False,
-            'can_edit': node.has_permission(user, WRITE),
-            'can_edit_tags': node.has_permission(user, WRITE),
+            'can_edit': can_edit,
+            'can_edit_tags': can_edit,
             'has_read_permissions': node.has_permission(user, READ),
             'permissions': node.get_permissions(user) if user else [],
             'id': user._id if user else None,
             'username': user.username if user else None,
             'fullname': user.fullname if user else '',
             'can_comment': node.can_comment(auth),
-            'show_wiki_widget': _should_show_wiki_widget(node, user),
+            'show_wiki_widget': _should_show_wiki_widget(node, user, can_edit=can_edit),
             'dashboard_id': bookmark_collection_id,
             'institutions': get_affiliated_institutions(user) if user else [],
         },
@@ -869,15 +878,17 @@ def _view_project(node, auth, primary=False,
             serialize_node_summary(node=each, auth=auth, primary=not node.has_node_link_to(each), show_path=False)
             for each in descendants
         ]
+    # Contributors are prefetched for all embedded nodes at once rather than
+    # re-queried per node by serialize_node_summary
     if embed_registrations:
         data['node']['registrations'] = [
             serialize_node_summary(node=each, auth=auth, show_path=False)
-            for each in node.registrations_all.order_by('-registered_date').exclude(is_deleted=True)
+            for each in node.registrations_all.order_by('-registered_date').exclude(is_deleted=True).prefetch_related('contributor_set__user__guids')
         ]
     if embed_forks:
         data['node']['forks'] = [
             serialize_node_summary(node=each, auth=auth, show_path=False)
-            for each in node.forks.exclude(type='osf.registration').exclude(is_deleted=True).order_by('-forked_date')
+            for each in node.forks.exclude(type='osf.registration').exclude(is_deleted=True).order_by('-forked_date').prefetch_related('contributor_set__user__guids')
         ]
     return data
 
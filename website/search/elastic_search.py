@@ -74,6 +74,9 @@ NOT_ANALYZED_PROPERTY = {'type': 'string', 'index': 'not_analyzed'}
 # Perform stemming on the field it's applied to.
 ENGLISH_ANALYZER_PROPERTY = {'type': 'string', 'analyzer': 'english'}
 
+# Splits a contributor search query into its whitespace- or hyphen-separated terms
+CONTRIBUTOR_QUERY_SPLITTER = re.compile(r'[\s-]+')
+
 INDEX = settings.ELASTIC_INDEX
 
 CLIENT = None
@@ -959,7 +962,7 @@ def search_contributor(query, page=0, size=10, exclude=None, current_user=None):
 
     """
     start = (page * size)
-    items = re.split(r'[\s-]+', query)
+    items = CONTRIBUTOR_QUERY_SPLITTER.split(query)
     exclude = exclude or []
     normalized_items = []
     for item in items: